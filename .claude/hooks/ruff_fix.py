@@ -3,12 +3,21 @@
 #
 # - すべて修正できれば exit 0
 # - 修正後も違反が残れば exit 2（Claude に自動修正を依頼）
+#
+# Ruff は全ファイルをまとめて 1 回だけ起動する。PATH 上に ruff があれば
+# 直接呼び出し、無ければ uv run 経由で実行する。
 
 import json
 import subprocess
 import sys
 
-data = json.load(sys.stdin)
+try:
+    # orjson があれば C 実装で高速にパースする（無ければ標準 json）
+    import orjson
+
+    data = orjson.loads(sys.stdin.buffer.read())
+except ImportError:
+    data = json.load(sys.stdin)
 tool_input = data.get("tool_input", {})
 
 paths = []
@@ -21,24 +30,46 @@ py_files = [p for p in paths if p.endswith(".py")]
 if not py_files:
     sys.exit(0)  # 対象なし
 
-failed = []
-for path in py_files:
-    # uv run ruff check --fix <file>
+ruff_args = ["ruff", "check", "--fix", "--output-format=json", *py_files]
+try:
+    result = subprocess.run(
+        ruff_args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+except FileNotFoundError:
+    # ruff が PATH に無い場合は uv run ruff check --fix ...
     result = subprocess.run(
-        ["uv", "run", "ruff", "check", "--fix", path],
+        ["uv", "run", *ruff_args],
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+        stderr=subprocess.PIPE,
         text=True,
     )
-    if result.returncode != 0:  # 0: OK, 1:違反残り、2/123 等:設定エラー
-        failed.append((path, result.stdout))
 
-if not failed:
+if result.returncode == 0:  # 0: OK, 1:違反残り、2/123 等:設定エラー
     sys.exit(0)  # 全部 OK
 
+# 残った違反をファイルごとにまとめる
+failed = {}
+try:
+    for violation in json.loads(result.stdout):
+        location = violation.get("location") or {}
+        failed.setdefault(violation["filename"], []).append(
+            f"{location.get('row')}:{location.get('column')}: "
+            f"{violation.get('code')} {violation.get('message')}"
+        )
+except (ValueError, KeyError, TypeError):
+    failed = {}
+
+if not failed:
+    # JSON として解釈できない（設定エラー等）場合はログ全体を返す
+    failed = {" ".join(py_files): [result.stdout + result.stderr]}
+
 # ここに来たら Ruff が修正し切れなかった or 設定エラー
 # Claude にフィードバックするため stderr に詳細を流して exit 2
-for path, log in failed:
+for path, logs in failed.items():
+    log = "\n".join(logs)
     print(
         f"それぞれの問題に対してどのような選択肢があるかを考えて、適切に修正してください。Ruff のエラー内容: {path}:{log}",
         file=sys.stderr,
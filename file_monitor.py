@@ -10,86 +10,181 @@ import sys
 import time
 import datetime
 import threading
+import itertools
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from collections import defaultdict
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Set
+from enum import IntEnum
+from typing import Dict, List, Optional, Set
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
 
-@dataclass
+class EventType(IntEnum):
+    """変更の種類"""
+    CREATED = 0
+    MODIFIED = 1
+    DELETED = 2
+    MOVED = 3
+
+
+# EventType の値をインデックスとする表示名
+_EVENT_TYPE_NAMES = ('新規作成', '更新', '削除', '移動・リネーム')
+
+
+@dataclass(slots=True)
 class ChangeRecord:
-    """変更記録を格納するデータクラス"""
-    timestamp: datetime.datetime
-    event_type: str  # 'created', 'modified', 'deleted', 'moved'
-    path: str
+    """変更記録を格納するデータクラス（パスはディレクトリID + ファイル名で保持）"""
+    timestamp: float  # エポック秒（表示時に書式化）
+    event_type: EventType
+    dir_id: int
+    name: str
     is_directory: bool
-    old_path: str = None  # 移動/リネーム時の旧パス
+    old_dir_id: Optional[int] = None  # 移動/リネーム時の旧パス
+    old_name: Optional[str] = None
+
+
+def _disconnect_aware_emitter(emitter_class, disconnect_evt: threading.Event):
+    """読み取り失敗を接続断として通知するエミッタークラスを作成"""
+    
+    class DisconnectAwareEmitter(emitter_class):
+        def queue_events(self, timeout):
+            """イベント読み取り（ReadDirectoryChangesW / inotify の失敗時は停止）"""
+            try:
+                super().queue_events(timeout)
+            except OSError:
+                # ERROR_NETNAME_DELETED 等: 読み取りを止めて再接続に任せる
+                self.stop()
+        
+        def stop(self):
+            """停止（読み取り失敗や監視対象パスの削除で自ら停止した場合は切断イベントをセット）"""
+            if threading.current_thread() is self:
+                disconnect_evt.set()
+            super().stop()
+    
+    return DisconnectAwareEmitter
+
+
+class DisconnectAwareObserver(Observer):
+    """監視の失敗を接続断として通知するObserver"""
+    
+    def __init__(self, disconnect_evt: threading.Event, **kwargs):
+        super().__init__(**kwargs)
+        # プラットフォーム別のエミッターを切断通知付きに差し替える
+        self._emitter_class = _disconnect_aware_emitter(self._emitter_class, disconnect_evt)
 
 
 class FileMonitorHandler(FileSystemEventHandler):
     """ファイルシステムイベントハンドラー"""
     
+    # 同一ファイルの更新イベントを1件にまとめる間隔（ミリ秒）
+    COALESCE_MS = 500
+    
     def __init__(self):
         super().__init__()
-        self.changes = defaultdict(list)
+        self.changes = deque()  # 発生順（時刻昇順）に保持
+        self._report_cursor = 0  # 前回レポート以降の最初の変更のインデックス
+        self._recent: Dict[str, float] = {}  # パス → 最終更新記録時刻（ミリ秒）
+        self._coalesce_ms = self.COALESCE_MS
+        self._dir_ids: Dict[str, int] = {}  # ディレクトリパス → ID
+        self._dir_names: Dict[int, str] = {}  # ID → ディレクトリパス
+        self._next_dir_id = 0
         self.lock = threading.Lock()
     
     def on_created(self, event: FileSystemEvent):
         """ファイル・ディレクトリ作成時"""
-        self._record_change('created', event.src_path, event.is_directory)
+        self._record_change(EventType.CREATED, event.src_path, event.is_directory)
     
     def on_modified(self, event: FileSystemEvent):
         """ファイル・ディレクトリ変更時"""
         if not event.is_directory:  # ディレクトリの変更は除外（頻繁すぎるため）
-            self._record_change('modified', event.src_path, event.is_directory)
+            self._record_change(EventType.MODIFIED, event.src_path, event.is_directory)
     
     def on_deleted(self, event: FileSystemEvent):
         """ファイル・ディレクトリ削除時"""
-        self._record_change('deleted', event.src_path, event.is_directory)
+        self._record_change(EventType.DELETED, event.src_path, event.is_directory)
     
     def on_moved(self, event: FileSystemEvent):
         """ファイル・ディレクトリ移動/リネーム時"""
-        self._record_change('moved', event.dest_path, event.is_directory, event.src_path)
+        self._record_change(EventType.MOVED, event.dest_path, event.is_directory, event.src_path)
     
-    def _record_change(self, event_type: str, path: str, is_directory: bool, old_path: str = None):
+    def _record_change(self, event_type: EventType, path: str, is_directory: bool, old_path: str = None):
         """変更を記録"""
         with self.lock:
+            if event_type == EventType.MODIFIED:
+                # 保存時の連続した更新イベントはまとめて1件とする
+                now_ms = time.monotonic() * 1000
+                if now_ms - self._recent.get(path, 0) < self._coalesce_ms:
+                    return
+                self._recent[path] = now_ms
+            
+            dir_id, name = self._split_path(path)
+            old_dir_id, old_name = self._split_path(old_path) if old_path else (None, None)
             change = ChangeRecord(
-                timestamp=datetime.datetime.now(),
+                timestamp=time.time(),
                 event_type=event_type,
-                path=path,
+                dir_id=dir_id,
+                name=name,
                 is_directory=is_directory,
-                old_path=old_path
+                old_dir_id=old_dir_id,
+                old_name=old_name
             )
-            # 日付キーで分類
-            date_key = change.timestamp.strftime('%Y-%m-%d')
-            self.changes[date_key].append(change)
+            self.changes.append(change)
+    
+    def _split_path(self, path: str):
+        """パスをディレクトリIDとファイル名に分割（ロック取得済みで呼ぶこと）"""
+        dirname, name = os.path.split(path)
+        dir_id = self._dir_ids.get(dirname)
+        if dir_id is None:
+            dir_id = self._next_dir_id
+            self._next_dir_id += 1
+            dirname = sys.intern(dirname)
+            self._dir_ids[dirname] = dir_id
+            self._dir_names[dir_id] = dirname
+        return dir_id, name
     
-    def get_changes_since_last_report(self, last_report_time: datetime.datetime) -> List[ChangeRecord]:
+    def get_path(self, dir_id: int, name: str) -> str:
+        """ディレクトリIDとファイル名からフルパスを復元"""
+        return os.path.join(self._dir_names[dir_id], name)
+    
+    def get_changes_since_last_report(self, last_report_time: float) -> List[ChangeRecord]:
         """前回のレポート以降の変更を取得"""
         with self.lock:
-            all_changes = []
-            for date_changes in self.changes.values():
-                for change in date_changes:
-                    if change.timestamp > last_report_time:
-                        all_changes.append(change)
-            return sorted(all_changes, key=lambda x: x.timestamp)
+            # 記録は時刻昇順なので二分探索で開始位置を求める
+            lo = self._report_cursor
+            if lo > len(self.changes) or (lo > 0 and self.changes[lo - 1].timestamp > last_report_time):
+                lo = 0
+            idx = bisect_right(self.changes, last_report_time, lo=lo, key=lambda x: x.timestamp)
+            self._report_cursor = idx
+            # 新しい側（右端）から必要な件数だけ取り出す
+            snapshot = list(itertools.islice(reversed(self.changes), len(self.changes) - idx))
+        
+        # 並べ替えはロック外で行う
+        snapshot.reverse()
+        return snapshot
     
     def clear_old_changes(self, days_to_keep: int = 7):
         """古い変更記録を削除（メモリ節約）"""
-        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days_to_keep)
+        cutoff_ts = time.time() - days_to_keep * 86400
         with self.lock:
-            dates_to_remove = []
-            for date_str in self.changes:
-                date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-                if date_obj < cutoff_date:
-                    dates_to_remove.append(date_str)
+            # 記録は時刻昇順なので削除件数は二分探索で求まる
+            expired = bisect_left(self.changes, cutoff_ts, key=lambda x: x.timestamp)
+            for _ in range(expired):
+                self.changes.popleft()
+            self._report_cursor = max(self._report_cursor - expired, 0)
+            
+            # どの記録からも参照されなくなったディレクトリIDを削除
+            if expired:
+                referenced = {c.dir_id for c in self.changes}
+                referenced.update(c.old_dir_id for c in self.changes if c.old_dir_id is not None)
+                for dir_id in self._dir_names.keys() - referenced:
+                    del self._dir_ids[self._dir_names.pop(dir_id)]
             
-            for date_str in dates_to_remove:
-                del self.changes[date_str]
+            # 集約期間を過ぎた更新記録時刻を削除
+            expire_ms = time.monotonic() * 1000 - self._coalesce_ms
+            self._recent = {p: t for p, t in self._recent.items() if t >= expire_ms}
 
 
 class FileMonitor:
@@ -101,12 +196,18 @@ class FileMonitor:
     # レポート時刻
     REPORT_HOURS = [6, 10, 14, 17]
     
+    # 切断イベント待機の最大秒数（タイムアウト時は日次の掃除のみ実施）
+    DISCONNECT_WAIT_SECONDS = 3600
+    
     def __init__(self):
         self.observer = None
         self.handler = FileMonitorHandler()
-        self.last_report_time = datetime.datetime.now()
+        self.last_report_time = time.time()
         self.running = False
         self.report_thread = None
+        self._disconnect_evt = threading.Event()
+        self._last_cleanup_date = None
+        self._upcoming_reports = deque()  # 今後のレポート時刻（昇順）
         
     def start(self):
         """監視開始"""
@@ -122,10 +223,11 @@ class FileMonitor:
         
         try:
             # Observer設定
-            self.observer = Observer()
+            self.observer = DisconnectAwareObserver(self._disconnect_evt)
             self.observer.schedule(self.handler, self.WATCH_PATH, recursive=True)
             
             # 監視開始
+            self._disconnect_evt.clear()
             self.observer.start()
             self.running = True
             
@@ -155,6 +257,7 @@ class FileMonitor:
             return
         
         self.running = False
+        self._disconnect_evt.set()  # メインループの待機を解除
         
         if self.observer:
             self.observer.stop()
@@ -163,58 +266,98 @@ class FileMonitor:
         print("ファイル監視を停止しました。")
     
     def _main_loop(self):
-        """メインループ"""
+        """メインループ（切断イベント発生時のみ監視パスを確認）"""
+        while self.running:
+            if self._wait_disconnect(self.DISCONNECT_WAIT_SECONDS):
+                self._disconnect_evt.clear()
+                if not self.running:
+                    break
+                self._reconnect()
+            
+            # 古い変更記録を削除（メモリ節約、1日1回）
+            self._clear_old_changes_daily()
+    
+    def _wait_disconnect(self, timeout: float) -> bool:
+        """切断イベントを待機（WindowsでもCtrl+Cが効くよう1秒刻みで待つ）"""
+        deadline = time.monotonic() + timeout
         while self.running:
-            # ネットワークドライブ接続確認（5分毎）
-            if not os.path.exists(self.WATCH_PATH):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._disconnect_evt.wait(timeout=min(remaining, 1)):
+                return True
+        return self._disconnect_evt.is_set()
+    
+    def _reconnect(self):
+        """ネットワークドライブの接続復旧を待機し、監視を再登録"""
+        disconnected = False
+        while self.running:
+            if os.path.exists(self.WATCH_PATH):
+                try:
+                    # 停止したエミッターを破棄して監視を登録し直す
+                    self.observer.unschedule_all()
+                    self.observer.schedule(self.handler, self.WATCH_PATH, recursive=True)
+                    break
+                except OSError:
+                    pass  # 確認直後に再び切断された場合は待機に戻る
+            
+            if not disconnected:
+                disconnected = True
                 print(f"警告: 監視対象パスへの接続が切れています: {self.WATCH_PATH}")
                 print("接続復旧を待機中...")
-                
-                # 接続復旧を待つ
-                while self.running and not os.path.exists(self.WATCH_PATH):
-                    time.sleep(30)  # 30秒毎に確認
-                
-                if self.running:
-                    print("接続が復旧しました。監視を継続します。")
             
-            # 古い変更記録を削除（メモリ節約）
+            # 接続復旧を待つ（切断中のみ30秒毎に確認）
+            time.sleep(30)
+        
+        if not self.running:
+            return
+        
+        if disconnected:
+            print("接続が復旧しました。監視を継続します。")
             self.handler.clear_old_changes()
-            
-            time.sleep(300)  # 5分毎にチェック
+            self._last_cleanup_date = datetime.date.today()
+    
+    def _clear_old_changes_daily(self):
+        """日付が変わった場合のみ古い変更記録を削除"""
+        today = datetime.date.today()
+        if self._last_cleanup_date != today:
+            self.handler.clear_old_changes()
+            self._last_cleanup_date = today
     
     def _report_scheduler(self):
         """定時レポートスケジューラー"""
         while self.running:
             now = datetime.datetime.now()
             
-            # 次のレポート時刻を計算
-            next_report = self._get_next_report_time(now)
+            if not self._upcoming_reports:
+                self._refill_upcoming(now)
             
             # 次のレポート時刻まで待機
-            wait_seconds = (next_report - now).total_seconds()
+            wait_seconds = (self._upcoming_reports[0] - now).total_seconds()
             if wait_seconds > 0:
                 time.sleep(min(wait_seconds, 60))  # 最大1分で再チェック
                 continue
             
+            # 経過済みのレポート時刻をまとめて消化（スリープ復帰時の重複実行防止）
+            while self._upcoming_reports and self._upcoming_reports[0] <= now:
+                self._upcoming_reports.popleft()
+            
             # レポート実行
             self._generate_report()
-            
-            # 次の分まで待機（重複実行防止）
-            time.sleep(61)
     
-    def _get_next_report_time(self, current_time: datetime.datetime) -> datetime.datetime:
-        """次のレポート時刻を取得"""
+    def _refill_upcoming(self, current_time: datetime.datetime):
+        """今日の残りと明日のレポート時刻を補充"""
         current_date = current_time.date()
-        current_hour = current_time.hour
-        
-        # 今日の残りのレポート時刻をチェック
-        for hour in self.REPORT_HOURS:
-            if hour > current_hour:
-                return datetime.datetime.combine(current_date, datetime.time(hour, 0))
-        
-        # 今日のレポート時刻がすべて過ぎている場合、明日の最初のレポート時刻
         tomorrow = current_date + datetime.timedelta(days=1)
-        return datetime.datetime.combine(tomorrow, datetime.time(self.REPORT_HOURS[0], 0))
+        
+        self._upcoming_reports.extend(
+            datetime.datetime.combine(current_date, datetime.time(hour, 0))
+            for hour in self.REPORT_HOURS if hour > current_time.hour
+        )
+        self._upcoming_reports.extend(
+            datetime.datetime.combine(tomorrow, datetime.time(hour, 0))
+            for hour in self.REPORT_HOURS
+        )
     
     def _generate_report(self):
         """定時レポート生成・表示"""
@@ -232,33 +375,38 @@ class FileMonitor:
             print("-" * 50)
             
             # 変更タイプ別に分類
-            by_type = defaultdict(list)
+            by_type: List[List[ChangeRecord]] = [[] for _ in EventType]
             for change in changes:
                 by_type[change.event_type].append(change)
             
-            # 各タイプの変更を表示
-            type_names = {
-                'created': '新規作成',
-                'modified': '更新',
-                'deleted': '削除',
-                'moved': '移動・リネーム'
-            }
+            # 同じ分の記録は同じ表示文字列になるため、分単位でキャッシュして書式化を1回にする
+            time_strs: Dict[int, str] = {}
             
-            for event_type, type_changes in by_type.items():
-                print(f"\n■ {type_names.get(event_type, event_type)} ({len(type_changes)}件)")
+            # 各タイプの変更を表示
+            for event_type, type_changes in zip(EventType, by_type):
+                if not type_changes:
+                    continue
+                print(f"\n■ {_EVENT_TYPE_NAMES[event_type]} ({len(type_changes)}件)")
                 for change in type_changes:
-                    time_str = change.timestamp.strftime('%m/%d %H:%M')
+                    minute = int(change.timestamp // 60)
+                    time_str = time_strs.get(minute)
+                    if time_str is None:
+                        time_str = time.strftime('%m/%d %H:%M', time.localtime(change.timestamp))
+                        time_strs[minute] = time_str
                     type_str = "フォルダ" if change.is_directory else "ファイル"
                     
-                    if change.event_type == 'moved':
-                        print(f"  {time_str} [{type_str}] {change.old_path} → {change.path}")
+                    path = self.handler.get_path(change.dir_id, change.name)
+                    
+                    if change.event_type == EventType.MOVED:
+                        old_path = self.handler.get_path(change.old_dir_id, change.old_name)
+                        print(f"  {time_str} [{type_str}] {old_path} → {path}")
                     else:
-                        print(f"  {time_str} [{type_str}] {change.path}")
+                        print(f"  {time_str} [{type_str}] {path}")
         
         print("="*70)
         
         # 前回レポート時刻を更新
-        self.last_report_time = current_time
+        self.last_report_time = current_time.timestamp()
 
 
 def main():
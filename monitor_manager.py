@@ -7,14 +7,25 @@
 
 import os
 import sys
+import ctypes
 import time
-import signal
 import subprocess
 from pathlib import Path
 from typing import Optional
 
 import psutil
 
+# Windows API 定数
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+if os.name == 'nt':  # Windows: kernel32 の関数定義は一度だけ行う
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.OpenProcess.restype = ctypes.c_void_p
+    _kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+    _kernel32.GetExitCodeProcess.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_ulong)]
+
 
 class MonitorManager:
     """監視プロセス管理クラス"""
@@ -22,6 +33,10 @@ class MonitorManager:
     PID_FILE = "file_monitor.pid"
     SCRIPT_NAME = "file_monitor.py"
     
+    # PIDファイル置き換えの再試行（Windowsでは読み手が開いている間 os.replace が失敗する）
+    PID_REPLACE_RETRIES = 5
+    PID_REPLACE_INTERVAL = 0.05
+    
     def __init__(self):
         self.script_path = Path(__file__).parent / self.SCRIPT_NAME
         self.pid_file = Path(__file__).parent / self.PID_FILE
@@ -67,8 +82,11 @@ class MonitorManager:
                     cwd=Path(__file__).parent
                 )
             
-            # PIDファイル作成
-            self._write_pid_file(process.pid)
+            # PIDファイル作成（作成できないと停止できなくなるため起動失敗とする）
+            if not self._write_pid_file(process.pid):
+                print("エラー: PIDファイルを作成できないため、起動したプロセスを停止します。")
+                process.terminate()
+                return False
             
             # プロセス起動確認
             time.sleep(2)
@@ -99,33 +117,24 @@ class MonitorManager:
             return False
         
         try:
-            # プロセス終了
-            if os.name == 'nt':  # Windows
-                subprocess.run(["taskkill", "/PID", str(pid), "/F"], 
-                             capture_output=True, check=False)
-            else:  # Unix/Linux
-                os.kill(pid, signal.SIGTERM)
-            
-            # 終了確認（最大10秒待機）
-            for _ in range(10):
-                time.sleep(1)
-                if not self._is_process_running(pid):
-                    break
-            else:
+            # プロセス終了（終了をOSの通知で待機、最大10秒）
+            process = psutil.Process(pid)
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except psutil.TimeoutExpired:
                 # 強制終了
-                if os.name == 'nt':
-                    subprocess.run(["taskkill", "/PID", str(pid), "/F"], 
-                                 capture_output=True, check=False)
-                else:
-                    os.kill(pid, signal.SIGKILL)
-            
-            self._remove_pid_file()
-            print(f"ファイル監視を停止しました (PID: {pid})")
-            return True
-            
+                process.kill()
+                process.wait(timeout=2)
+        except psutil.NoSuchProcess:
+            pass  # 既に終了済み
         except Exception as e:
             print(f"エラー: プロセス停止に失敗しました: {e}")
             return False
+        
+        self._remove_pid_file()
+        print(f"ファイル監視を停止しました (PID: {pid})")
+        return True
     
     def check_status(self) -> None:
         """監視プロセスの状態を確認"""
@@ -145,7 +154,10 @@ class MonitorManager:
                 print(f"ステータス: 実行中")
                 print(f"PID: {pid}")
                 print(f"開始時刻: {process.create_time()}")
-                print(f"CPU使用率: {process.cpu_percent():.1f}%")
+                # 起動からの平均CPU使用率（計測待ちなしで意味のある値になる）
+                cpu_times = process.cpu_times()
+                elapsed = max(time.time() - process.create_time(), 1e-6)
+                print(f"CPU使用率（起動後平均）: {(cpu_times.user + cpu_times.system) / elapsed * 100:.1f}%")
                 print(f"メモリ使用量: {process.memory_info().rss / 1024 / 1024:.1f} MB")
                 
                 # 監視対象パスの存在確認
@@ -174,13 +186,31 @@ class MonitorManager:
             pass
         return None
     
-    def _write_pid_file(self, pid: int) -> None:
-        """PIDファイルを作成"""
+    def _write_pid_file(self, pid: int) -> bool:
+        """PIDファイルを作成（一時ファイルに書いてから置き換え、読み手が空のファイルを見ないようにする）"""
+        tmp_file = self.pid_file.with_suffix('.pid.tmp')
         try:
-            with open(self.pid_file, 'w', encoding='utf-8') as f:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0)
+            fd = os.open(tmp_file, flags, 0o644)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
                 f.write(str(pid))
+            
+            for attempt in range(self.PID_REPLACE_RETRIES):
+                try:
+                    os.replace(tmp_file, self.pid_file)
+                    return True
+                except PermissionError:
+                    # 状態確認などでPIDファイルが開かれている間は少し待って再試行
+                    if attempt == self.PID_REPLACE_RETRIES - 1:
+                        raise
+                    time.sleep(self.PID_REPLACE_INTERVAL)
         except IOError as e:
-            print(f"警告: PIDファイルの作成に失敗しました: {e}")
+            print(f"エラー: PIDファイルの作成に失敗しました: {e}")
+            try:
+                tmp_file.unlink(missing_ok=True)
+            except IOError:
+                pass
+        return False
     
     def _remove_pid_file(self) -> None:
         """PIDファイルを削除"""
@@ -192,10 +222,33 @@ class MonitorManager:
     
     def _is_process_running(self, pid: int) -> bool:
         """プロセスが実行中かチェック"""
+        if os.name == 'nt':  # Windows
+            return self._is_process_running_windows(pid)
+        
         try:
-            return psutil.pid_exists(pid)
-        except:
+            os.kill(pid, 0)  # シグナル0: 存在確認のみ
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # 他ユーザーのプロセスとして存在
+        except OSError:
             return False
+    
+    def _is_process_running_windows(self, pid: int) -> bool:
+        """プロセスが実行中かチェック（Windows API）"""
+        handle = _kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # アクセス拒否はプロセスが存在することを意味する
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        
+        try:
+            exit_code = ctypes.c_ulong()
+            if not _kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return False
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            _kernel32.CloseHandle(handle)
 
 
 def main():
@@ -1,11 +1,130 @@
 import streamlit as st
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
 import re
 
+# ティッカーシンボルの形式（1-5文字のアルファベット）
+_TICKER_RE = re.compile(r'^[A-Z]{1,5}$')
+
+
+class _EmptyHistoryError(Exception):
+    """株価データが空（例外はキャッシュされないため、空の結果を再取得させる）"""
+
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def _fetch_history_cached(symbol: str, period: str) -> tuple[pd.DataFrame, dict]:
+    """株価履歴と銘柄情報を取得（10分間キャッシュ）"""
+    stock = yf.Ticker(symbol)
+    df = stock.history(period=period)
+    if df.empty:
+        # yfinance は一時的な失敗も空のDataFrameで返すため、キャッシュしない
+        raise _EmptyHistoryError(symbol)
+    return df, stock.info
+
+
+def fetch_history(symbol: str, period: str) -> tuple[pd.DataFrame, dict]:
+    """株価履歴と銘柄情報を取得（空の結果はキャッシュせず毎回取得し直す）"""
+    try:
+        return _fetch_history_cached(symbol, period)
+    except _EmptyHistoryError:
+        return pd.DataFrame(), {}
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """累積和による移動平均（NaNを含む窓はNaN、rolling(window).mean() と同じ結果）"""
+    is_nan = np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(is_nan, 0.0, values))))
+    nan_count = np.concatenate(([0], np.cumsum(is_nan)))
+    
+    means = (csum[window:] - csum[:-window]) / window
+    means[(nan_count[window:] - nan_count[:-window]) > 0] = np.nan
+    return np.concatenate((np.full(window - 1, np.nan), means))
+
+
+def _df_fingerprint(df: pd.DataFrame) -> tuple:
+    """チャートキャッシュ用のDataFrame識別子（全データのハッシュより軽量）"""
+    # 取引時間中は最終行の値が更新されるため、最終行の値も含める
+    return (df.index[-1].value, len(df), tuple(df.columns), tuple(df.iloc[-1].tolist()))
+
+
+_DF_HASH_FUNCS = {pd.DataFrame: _df_fingerprint}
+
+# チャートは st.cache_resource で保持する。cache_data はヒットの度に pickle から
+# Figure を再構築（トレースを再検証）するため、作成し直すのと変わらない。
+# Figure は作成後に変更しないため、同じオブジェクトを共有しても安全。
+
+
+@st.cache_resource(hash_funcs=_DF_HASH_FUNCS, ttl=600, max_entries=256, show_spinner=False)
+def build_candlestick(symbol: str, df: pd.DataFrame) -> go.Figure:
+    """ローソク足チャートを作成"""
+    fig = go.Figure()
+    
+    fig.add_trace(go.Candlestick(
+        x=df.index,
+        open=df['Open'],
+        high=df['High'],
+        low=df['Low'],
+        close=df['Close'],
+        name="株価"
+    ))
+    
+    fig.update_layout(
+        title=f"{symbol} 株価チャート",
+        yaxis_title="価格 ($)",
+        xaxis_title="日付",
+        template="plotly_white"
+    )
+    return fig
+
+
+@st.cache_resource(hash_funcs=_DF_HASH_FUNCS, ttl=600, max_entries=256, show_spinner=False)
+def build_volume_chart(symbol: str, df: pd.DataFrame) -> go.Figure:
+    """出来高チャートを作成"""
+    fig_volume = px.bar(
+        df, 
+        x=df.index, 
+        y='Volume',
+        title=f"{symbol} 出来高"
+    )
+    fig_volume.update_layout(template="plotly_white")
+    return fig_volume
+
+
+@st.cache_resource(hash_funcs=_DF_HASH_FUNCS, ttl=600, max_entries=256, show_spinner=False)
+def build_ma_chart(symbol: str, df: pd.DataFrame) -> go.Figure:
+    """終値と移動平均線のチャートを作成"""
+    fig_ma = go.Figure()
+    
+    fig_ma.add_trace(go.Scatter(
+        x=df.index, y=df['Close'], 
+        mode='lines', name='終値'
+    ))
+    
+    if 'MA20' in df.columns:
+        fig_ma.add_trace(go.Scatter(
+            x=df.index, y=df['MA20'], 
+            mode='lines', name='20日移動平均'
+        ))
+    
+    if 'MA50' in df.columns:
+        fig_ma.add_trace(go.Scatter(
+            x=df.index, y=df['MA50'], 
+            mode='lines', name='50日移動平均'
+        ))
+    
+    fig_ma.update_layout(
+        title=f"{symbol} 価格と移動平均線",
+        yaxis_title="価格 ($)",
+        xaxis_title="日付",
+        template="plotly_white"
+    )
+    return fig_ma
+
+
 st.set_page_config(
     page_title="株価分析アプリ",
     page_icon="📈",
@@ -24,7 +143,8 @@ with col1:
         help="例: AAPL (Apple), MSFT (Microsoft), GOOGL (Google)"
     )
     
-    if symbol and not re.match(r'^[A-Z]{1,5}$', symbol.upper()):
+    sym_up = symbol.upper()
+    if symbol and not _TICKER_RE.match(sym_up):
         st.error("無効なティッカーシンボルです。1-5文字のアルファベットを入力してください。")
         st.stop()
 
@@ -37,27 +157,32 @@ with col2:
 
 if st.button("分析開始", type="primary"):
     try:
-        with st.spinner(f"{symbol}の株価データを取得中..."):
-            stock = yf.Ticker(symbol)
-            df = stock.history(period=period)
+        with st.spinner(f"{sym_up}の株価データを取得中..."):
+            df, info = fetch_history(sym_up, period)
             
             if df.empty:
-                st.error(f"ティッカーシンボル '{symbol}' のデータが見つかりません。")
+                st.error(f"ティッカーシンボル '{sym_up}' のデータが見つかりません。")
             else:
-                info = stock.info
-                
-                st.subheader(f"{info.get('longName', symbol)} ({symbol})")
+                st.subheader(f"{info.get('longName', sym_up)} ({sym_up})")
                 
                 col1, col2, col3, col4 = st.columns(4)
                 
-                current_price = df['Close'].iloc[-1]
+                # 指標は一度だけ計算して使い回す
+                close = df['Close'].to_numpy()
+                high_max = float(df['High'].max())
+                low_min = float(df['Low'].min())
+                close_mean = float(np.nanmean(close))
+                close_std = float(np.nanstd(close, ddof=1))  # pandas と同じ標本標準偏差
+                vol_mean = float(df['Volume'].mean())
+                
+                current_price = close[-1]
                 
                 if len(df) < 2:
                     st.warning("データが不足しているため、前日比較ができません。")
                     change = 0
                     change_pct = 0
                 else:
-                    prev_price = df['Close'].iloc[-2]
+                    prev_price = close[-2]
                     change = current_price - prev_price
                     change_pct = (change / prev_price) * 100
                 
@@ -68,44 +193,18 @@ if st.button("分析開始", type="primary"):
                     st.metric("変化率", f"{change_pct:+.2f}%")
                 
                 with col3:
-                    st.metric("最高値", f"${df['High'].max():.2f}")
+                    st.metric("最高値", f"${high_max:.2f}")
                 
                 with col4:
-                    st.metric("最安値", f"${df['Low'].min():.2f}")
+                    st.metric("最安値", f"${low_min:.2f}")
                 
                 st.subheader("📊 株価チャート")
                 
-                fig = go.Figure()
-                
-                fig.add_trace(go.Candlestick(
-                    x=df.index,
-                    open=df['Open'],
-                    high=df['High'],
-                    low=df['Low'],
-                    close=df['Close'],
-                    name="株価"
-                ))
-                
-                fig.update_layout(
-                    title=f"{symbol} 株価チャート",
-                    yaxis_title="価格 ($)",
-                    xaxis_title="日付",
-                    template="plotly_white"
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(build_candlestick(sym_up, df), use_container_width=True)
                 
                 st.subheader("📈 出来高")
                 
-                fig_volume = px.bar(
-                    df, 
-                    x=df.index, 
-                    y='Volume',
-                    title=f"{symbol} 出来高"
-                )
-                fig_volume.update_layout(template="plotly_white")
-                
-                st.plotly_chart(fig_volume, use_container_width=True)
+                st.plotly_chart(build_volume_chart(sym_up, df), use_container_width=True)
                 
                 st.subheader("📋 統計情報")
                 
@@ -115,12 +214,12 @@ if st.button("分析開始", type="primary"):
                         "平均出来高", "価格レンジ"
                     ],
                     "値": [
-                        f"${df['Close'].mean():.2f}",
-                        f"${df['Close'].std():.2f}",
-                        f"${df['High'].max():.2f}",
-                        f"${df['Low'].min():.2f}",
-                        f"{df['Volume'].mean():,.0f}",
-                        f"${df['High'].max() - df['Low'].min():.2f}"
+                        f"${close_mean:.2f}",
+                        f"${close_std:.2f}",
+                        f"${high_max:.2f}",
+                        f"${low_min:.2f}",
+                        f"{vol_mean:,.0f}",
+                        f"${high_max - low_min:.2f}"
                     ]
                 }
                 
@@ -129,39 +228,14 @@ if st.button("分析開始", type="primary"):
                 
                 st.subheader("📊 移動平均線")
                 
+                # 累積和で移動平均を計算（rolling().mean() より高速）
                 data_length = len(df)
                 if data_length >= 20:
-                    df['MA20'] = df['Close'].rolling(window=20).mean()
+                    df['MA20'] = moving_average(close, 20)
                 if data_length >= 50:
-                    df['MA50'] = df['Close'].rolling(window=50).mean()
-                
-                fig_ma = go.Figure()
-                
-                fig_ma.add_trace(go.Scatter(
-                    x=df.index, y=df['Close'], 
-                    mode='lines', name='終値'
-                ))
-                
-                if data_length >= 20 and 'MA20' in df.columns:
-                    fig_ma.add_trace(go.Scatter(
-                        x=df.index, y=df['MA20'], 
-                        mode='lines', name='20日移動平均'
-                    ))
-                
-                if data_length >= 50 and 'MA50' in df.columns:
-                    fig_ma.add_trace(go.Scatter(
-                        x=df.index, y=df['MA50'], 
-                        mode='lines', name='50日移動平均'
-                    ))
-                
-                fig_ma.update_layout(
-                    title=f"{symbol} 価格と移動平均線",
-                    yaxis_title="価格 ($)",
-                    xaxis_title="日付",
-                    template="plotly_white"
-                )
-                
-                st.plotly_chart(fig_ma, use_container_width=True)
+                    df['MA50'] = moving_average(close, 50)
+                
+                st.plotly_chart(build_ma_chart(sym_up, df), use_container_width=True)
                 
                 with st.expander("生データ"):
                     st.dataframe(df)